@@ -0,0 +1,24 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# All records go through an unbounded queue; a single background listener
+# does the formatting and the stderr write, so request/worker threads never
+# block on stdout flushes or contend on the stream lock.
+_queue: queue.Queue = queue.Queue(-1)
+
+_stream = logging.StreamHandler(sys.stderr)
+_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+_listener = QueueListener(_queue, _stream)
+_listener.start()
+
+
+def get_logger(name: str) -> logging.Logger:
+    log = logging.getLogger(name)
+    if not log.handlers:
+        log.addHandler(QueueHandler(_queue))
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    return log
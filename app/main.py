@@ -1,19 +1,18 @@
-import os, json, uuid, shutil
-from typing import Dict, Any
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+import os, uuid
+from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import ValidationError
 
-from .schemas import RenderRequest, JobStatus, RenderPayload
-from .utils import fetch_payload, tmpdir
-from .renderer import build_ffmpeg_cmd, run_ffmpeg
-from .storage import upload_if_configured
+from .schemas import RenderRequest, JobStatus
+from .utils import fetch_payload
 from .parser import is_timeline_payload
+from .worker import render_job, save_job, load_job
+from .log import get_logger
+
+log = get_logger("render.api")
 
 PORT = int(os.getenv("PORT", "8080"))
 OUTPUT_DIR = "/workspace/outputs"
-BASE_URL = os.getenv("BASE_URL", "https://xiff2j86qmsii8-8080.proxy.runpod.net")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -26,26 +25,12 @@ app.add_middleware(
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
-JOBS: Dict[str, JobStatus] = {}
-
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
-def to_payload_model_with_raw(data: Dict[str, Any]) -> RenderPayload:
-    """
-    Always attach the original dict as _raw_dict so the renderer can decide.
-    If it's not our internal schema, renderer can still branch using the raw dict.
-    """
-    try:
-        p = RenderPayload(**data) if not is_timeline_payload(data) else RenderPayload()
-    except ValidationError:
-        p = RenderPayload()
-    setattr(p, "_raw_dict", data)
-    return p
-
 @app.post("/render", response_model=JobStatus)
-def render(req: RenderRequest, bg: BackgroundTasks):
+def render(req: RenderRequest):
     if not req.payload and not req.payload_url:
         raise HTTPException(400, "Provide either 'payload' or 'payload_url'")
 
@@ -56,23 +41,22 @@ def render(req: RenderRequest, bg: BackgroundTasks):
         except Exception as e:
             raise HTTPException(400, f"Failed to fetch payload_url: {e}")
     else:
-        raw_data = json.loads(req.payload.model_dump_json()) if req.payload else {}
+        # model_dump(mode="json") yields the same JSON-compatible dict without
+        # serializing to a string and re-parsing it
+        raw_data = req.payload.model_dump(mode="json") if req.payload else {}
 
-    # DEBUG
-    print("[render] Received payload keys:", list(raw_data.keys()))
+    log.info("Received payload keys: %s", list(raw_data.keys()))
     if is_timeline_payload(raw_data):
-        print("[render] Detected TIMELINE-style payload.")
+        log.info("Detected TIMELINE-style payload.")
     else:
-        print("[render] Detected INTERNAL-style payload (or unknown).")
-
-    payload = to_payload_model_with_raw(raw_data)
+        log.info("Detected INTERNAL-style payload (or unknown).")
 
     # Create job entry right away
     job_id = str(uuid.uuid4())
     file_name = req.output_filename or f"{job_id}.mp4"
     out_file = os.path.join(OUTPUT_DIR, file_name)
 
-    JOBS[job_id] = JobStatus(
+    job = JobStatus(
         id=job_id,
         status="queued",
         message="Queued",
@@ -80,51 +64,18 @@ def render(req: RenderRequest, bg: BackgroundTasks):
         logs=None,
         generation_time=0
     )
+    save_job(job)
 
-    def worker():
-        import time
-        JOBS[job_id].status = "running"
-        workdir = tmpdir(prefix=f"{job_id}_")
-        try:
-            cmd = build_ffmpeg_cmd(payload, workdir, out_file)
-            print("[render] ffmpeg cmd:", " ".join(cmd))
-
-            # start timer
-            start_time = time.time()
-            rc, logs = run_ffmpeg(cmd)
-            end_time = time.time()
-
-            generation_time = round(end_time - start_time, 2)
-
-            if rc != 0:
-                JOBS[job_id].status = "failed"
-                JOBS[job_id].message = f"FFmpeg exited with {rc}"
-                JOBS[job_id].logs = logs
-                JOBS[job_id].generation_time = generation_time
-                return
-
-            upload_if_configured(out_file)
-            JOBS[job_id].status = "success"
-            JOBS[job_id].output_url = f"{BASE_URL}/outputs/{file_name}"
-            JOBS[job_id].logs = logs
-            JOBS[job_id].generation_time = generation_time
-
-        except Exception as e:
-            JOBS[job_id].status = "failed"
-            JOBS[job_id].message = f"Error: {e}"
-        finally:
-            shutil.rmtree(workdir, ignore_errors=True)
-
-    # Run worker in background
-    bg.add_task(worker)
+    # Enqueue on the Dramatiq worker pool; any Uvicorn worker can serve the status
+    render_job.send(job_id, raw_data, out_file)
 
     # ✅ Return queued job immediately so FastAPI always has a valid response
-    return JOBS[job_id]
+    return job
 
 
 @app.get("/jobs/{job_id}", response_model=JobStatus)
 def job_status(job_id: str):
-    job = JOBS.get(job_id)
+    job = load_job(job_id)
     if not job:
         raise HTTPException(404, "Job not found")
     return job
@@ -1,5 +1,10 @@
+from operator import itemgetter
 from typing import Any, Dict, List, Optional, TypedDict
 
+# C-level key extraction: avoids a Python frame + dict __getitem__ per
+# comparison when sorting large timelines.
+_BY_START = itemgetter("start")
+
 class TLClip(TypedDict, total=False):
     src: str
     start: float
@@ -25,57 +30,61 @@ def _iter_tracks(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         return data["timeline"].get("tracks", []) or []
     return data.get("tracks", []) or []
 
-def extract_timeline_clips(data: Dict[str, Any]) -> List[TLClip]:
+def extract_timeline_all(data: Dict[str, Any]) -> tuple[List[TLClip], List[TLClip]]:
     """
-    Visual clips only (video/image) — used for the video concat / slideshow.
+    Single traversal producing (visual clips, audio clips). The two lists were
+    previously built by separate passes over the same tracks; the renderer
+    always needs both, so walk once and dispatch by asset type.
     """
-    clips: List[TLClip] = []
+    vclips: List[TLClip] = []
+    aclips: List[TLClip] = []
     for tr in _iter_tracks(data):
         for c in tr.get("clips", []) or []:
             asset = c.get("asset") or {}
             t = (asset.get("type") or "").lower()
-            if t not in ("video", "image"):
-                continue
-            length = float(c.get("length", 0.0))
-            if length <= 0 and t == "video":
-                # images can start with 0 (we'll assign duration later), but videos need length unless you want full file
-                continue
-            clips.append(TLClip(
-                src=str(asset.get("src", "")),
-                start=float(c.get("start", 0.0)),
-                length=float(c.get("length", 0.0)),
-                fit=c.get("fit"),
-                opacity=float(c["opacity"]) if c.get("opacity") is not None else None,
-                effects=c.get("effects"),
-                type=t,
-                position=str(asset.get("position", "")),
-            ))
-    clips.sort(key=lambda x: x["start"])
-    return clips
+            if t in ("video", "image"):
+                length = float(c.get("length", 0.0))
+                if length <= 0 and t == "video":
+                    # images can start with 0 (we'll assign duration later), but videos need length unless you want full file
+                    continue
+                # dict literal instead of the TLClip(...) call: TypedDict
+                # construction goes through a function call per clip, {} doesn't
+                vclips.append({
+                    "src": str(asset.get("src", "")),
+                    "start": float(c.get("start", 0.0)),
+                    "length": length,
+                    "fit": c.get("fit"),
+                    "opacity": float(c["opacity"]) if c.get("opacity") is not None else None,
+                    "effects": c.get("effects"),
+                    "type": t,
+                    "position": str(asset.get("position", "")),
+                })
+            elif t == "audio":
+                length = float(c.get("length", 0.0))
+                if length <= 0:
+                    continue
+                aclips.append({
+                    "src": str(asset.get("src", "")),
+                    "start": float(c.get("start", 0.0)),
+                    "length": length,
+                    "volume": float(asset["volume"]) if asset.get("volume") is not None else None,
+                    "type": t,
+                })
+    vclips.sort(key=_BY_START)
+    aclips.sort(key=_BY_START)
+    return vclips, aclips
+
+def extract_timeline_clips(data: Dict[str, Any]) -> List[TLClip]:
+    """
+    Visual clips only (video/image) — used for the video concat / slideshow.
+    """
+    return extract_timeline_all(data)[0]
 
 def extract_timeline_audio(data: Dict[str, Any]) -> List[TLClip]:
     """
     Audio clips only (asset.type == 'audio') — used for audio mixing.
     """
-    clips: List[TLClip] = []
-    for tr in _iter_tracks(data):
-        for c in tr.get("clips", []) or []:
-            asset = c.get("asset") or {}
-            t = (asset.get("type") or "").lower()
-            if t != "audio":
-                continue
-            length = float(c.get("length", 0.0))
-            if length <= 0:
-                continue
-            clips.append(TLClip(
-                src=str(asset.get("src", "")),
-                start=float(c.get("start", 0.0)),
-                length=length,
-                volume=float(asset["volume"]) if asset.get("volume") is not None else None,
-                type=t,
-            ))
-    clips.sort(key=lambda x: x["start"])
-    return clips
+    return extract_timeline_all(data)[1]
 
 def extract_timeline_subtitles(data: Dict[str, Any]) -> List[TLClip]:
     """
@@ -89,11 +98,11 @@ def extract_timeline_subtitles(data: Dict[str, Any]) -> List[TLClip]:
             t = (asset.get("type") or "").lower()
             if t != "subtitle":
                 continue
-            subs.append(TLClip(
-                src=str(asset.get("src", "")),
-                start=float(c.get("start", 0.0)),
-                length=float(c.get("length", 0.0)) if c.get("length") is not None else 0.0,
-                type=t,
-            ))
-    subs.sort(key=lambda x: x["start"])
+            subs.append({
+                "src": str(asset.get("src", "")),
+                "start": float(c.get("start", 0.0)),
+                "length": float(c.get("length", 0.0)) if c.get("length") is not None else 0.0,
+                "type": t,
+            })
+    subs.sort(key=_BY_START)
     return subs
@@ -1,18 +1,26 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
 import os
 import shutil
 import subprocess
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-import requests
+from PIL import Image
 
 from .schemas import RenderPayload
-from .utils import safe_filename_from_url, resolve_asset_src
+from .utils import SESSION, safe_filename_from_url, resolve_asset_src, stat_or_none
 from .parser import (
     is_timeline_payload,
-    extract_timeline_clips,
-    extract_timeline_audio,
+    extract_timeline_all,
     extract_timeline_subtitles,
 )
+from .log import get_logger
+
+log = get_logger("render.renderer")
 
 # --------- Config via ENV ----------
 INPUT_QUEUE_SIZE = os.getenv("INPUT_QUEUE_SIZE", "512")
@@ -20,8 +28,16 @@ PROBE_SIZE = os.getenv("PROBE_SIZE")
 ANALYZE_DURATION = os.getenv("ANALYZE_DURATION")
 FORCE_CPU = os.getenv("FORCE_CPU", "").lower() in ("1", "true", "yes", "on")
 FORCE_NVENC = os.getenv("FORCE_NVENC", "").lower() in ("1", "true", "yes", "on")
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "16"))
+# Upper bound on simultaneously running ffmpeg jobs per worker process; keep
+# low for NVENC (limited encode sessions) and use it to split cores for CPU jobs
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+# Shared across jobs and worker processes; keyed by URL hash so distinct URLs
+# never collide on basename and retries/repeat renders skip the download.
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.expanduser("~/.cache/video-gen"))
 
 
+@functools.lru_cache(maxsize=None)
 def which(cmd: str) -> Optional[str]:
     from shutil import which as _which
     return _which(cmd)
@@ -31,7 +47,19 @@ def run_cmd_capture(cmd: List[str]) -> subprocess.CompletedProcess:
     return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
 
 
-def has_nvenc_encoder(ffmpeg_bin: str) -> bool:
+def _bin_mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+# The NVENC probes are pure functions of the ffmpeg binary and the hardware,
+# but cost a fork/exec (and for nvenc_usable a ~1s test encode pinning a CUDA
+# context). Cache them per binary, keyed on its mtime so a binary swap
+# invalidates the cached answer.
+@functools.lru_cache(maxsize=8)
+def _has_nvenc_encoder(ffmpeg_bin: str, _mtime: float) -> bool:
     try:
         out = subprocess.check_output([ffmpeg_bin, "-hide_banner", "-encoders"], stderr=subprocess.STDOUT, text=True)
         return "h264_nvenc" in out
@@ -39,7 +67,12 @@ def has_nvenc_encoder(ffmpeg_bin: str) -> bool:
         return False
 
 
-def nvenc_usable(ffmpeg_bin: str) -> bool:
+def has_nvenc_encoder(ffmpeg_bin: str) -> bool:
+    return _has_nvenc_encoder(ffmpeg_bin, _bin_mtime(ffmpeg_bin))
+
+
+@functools.lru_cache(maxsize=8)
+def _nvenc_usable(ffmpeg_bin: str, _mtime: float) -> bool:
     test = [ffmpeg_bin, "-v", "error", "-f", "lavfi",
             "-i", "testsrc2=size=320x180:rate=10:duration=1",
             "-c:v", "h264_nvenc", "-f", "null", "-"]
@@ -47,76 +80,283 @@ def nvenc_usable(ffmpeg_bin: str) -> bool:
     return proc.returncode == 0
 
 
+def nvenc_usable(ffmpeg_bin: str) -> bool:
+    return _nvenc_usable(ffmpeg_bin, _bin_mtime(ffmpeg_bin))
+
+
+# Like the NVENC probes, the stream probes are keyed on (path, mtime, size):
+# download_cached replaces files in place when a remote asset changes, and a
+# long-lived worker must not drive copy/scale decisions with stale parameters.
+@functools.lru_cache(maxsize=256)
+def _probe_video_params(path: str, _mtime: float, _size: int) -> Optional[Tuple[int, int, float, str, str]]:
+    ffprobe = which("ffprobe")
+    if not ffprobe:
+        return None
+    proc = run_cmd_capture([ffprobe, "-v", "error", "-select_streams", "v:0",
+                            "-show_entries", "stream=codec_name,width,height,pix_fmt,r_frame_rate",
+                            "-of", "csv=p=0", path])
+    if proc.returncode != 0:
+        return None
+    try:
+        codec, w, h, pix_fmt, rate = proc.stdout.strip().split(",")[:5]
+        num, den = rate.split("/")
+        return int(w), int(h), float(num) / float(den), codec, pix_fmt
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def probe_video_params(path: str) -> Optional[Tuple[int, int, float, str, str]]:
+    """(width, height, fps, codec, pix_fmt) of the first video stream, or None."""
+    st = stat_or_none(path)
+    if st is None:
+        return None
+    return _probe_video_params(path, st.st_mtime, st.st_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _probe_audio_params(path: str, _mtime: float, _size: int) -> Optional[Tuple[str, int, int]]:
+    ffprobe = which("ffprobe")
+    if not ffprobe:
+        return None
+    proc = run_cmd_capture([ffprobe, "-v", "error", "-select_streams", "a:0",
+                            "-show_entries", "stream=codec_name,sample_rate,channels",
+                            "-of", "csv=p=0", path])
+    if proc.returncode != 0:
+        return None
+    try:
+        codec, rate, ch = proc.stdout.strip().split(",")[:3]
+        return codec, int(rate), int(ch)
+    except ValueError:
+        return None
+
+
+def probe_audio_params(path: str) -> Optional[Tuple[str, int, int]]:
+    """(codec, sample_rate, channels) of the first audio stream, or None."""
+    st = stat_or_none(path)
+    if st is None:
+        return None
+    return _probe_audio_params(path, st.st_mtime, st.st_size)
+
+
 def download_http(url: str, dest: str) -> str:
     os.makedirs(os.path.dirname(dest), exist_ok=True)
-    with requests.get(url, stream=True, timeout=300) as r:
-        r.raise_for_status()
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(r.raw, f)
+    # Write to a .part file and rename so concurrent jobs never see (or reuse)
+    # a half-written asset; 1 MB copy buffer keeps write() syscalls rare.
+    part = f"{dest}.part.{os.getpid()}"
+    try:
+        with SESSION.get(url, stream=True, timeout=300) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(part, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+        os.rename(part, dest)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
     return dest
 
 
-def download_asset(url: str, dest_dir: str) -> str:
+def prefetch_assets(clips: List[dict], dest_dir: str) -> Dict[str, str]:
+    """
+    Download every distinct clip src concurrently before graph construction.
+    Remote assets are fetched in parallel (network-bound), local/asset:// srcs
+    resolve immediately. Returns {src: local_path}.
+    """
+    srcs = {c["src"] for c in clips if c.get("src")}
+    if not srcs:
+        return {}
+    # One scandir over the cache answers every per-URL exists/size check from
+    # memory instead of two stat() syscalls per asset.
+    try:
+        existing = {e.name: e.stat().st_size for e in os.scandir(ASSET_CACHE_DIR) if e.is_file()}
+    except OSError:
+        existing = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+        return dict(zip(srcs, ex.map(lambda s: download_asset(s, dest_dir, existing), srcs)))
+
+
+def _cache_paths(url: str) -> Tuple[str, str]:
+    key = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+    ext = os.path.splitext(safe_filename_from_url(url))[1]
+    local = os.path.join(ASSET_CACHE_DIR, key + ext)
+    return local, f"{local}.meta"
+
+
+def download_cached(url: str, existing: Optional[Dict[str, int]] = None) -> str:
+    """
+    Download into the persistent URL-keyed cache. A JSON sidecar records the
+    server's validators; cached entries are revalidated with a conditional GET
+    so a 304 costs one round trip instead of a multi-MB transfer.
+
+    `existing` is an optional {filename: size} snapshot of ASSET_CACHE_DIR
+    (from one scandir) that answers the cache-hit check without stat calls.
+    """
+    local, meta_path = _cache_paths(url)
+    if existing is not None:
+        cached_size = existing.get(os.path.basename(local), 0)
+    else:
+        st = stat_or_none(local)
+        cached_size = st.st_size if st else 0
+    headers = {}
+    if cached_size > 0:
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        if not headers:
+            return local  # no validators recorded; trust the cached copy
+
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    part = f"{local}.part.{os.getpid()}"
+    try:
+        with SESSION.get(url, stream=True, timeout=300, headers=headers) as r:
+            if r.status_code == 304:
+                return local
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(part, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+            validators = {"etag": r.headers.get("ETag"),
+                          "last_modified": r.headers.get("Last-Modified")}
+        os.rename(part, local)
+        with open(meta_path, "w") as f:
+            json.dump(validators, f)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        if headers and os.path.exists(local):
+            return local  # revalidation failed; serve the cached copy
+        raise
+    return local
+
+
+def download_asset(url: str, dest_dir: str, existing: Optional[Dict[str, int]] = None) -> str:
     resolved = resolve_asset_src(url)
-    if resolved and os.path.exists(resolved):
+    if resolved and stat_or_none(resolved) is not None:
         return resolved
     if not resolved.startswith("http"):
         return resolved
-    local = os.path.join(dest_dir, safe_filename_from_url(resolved))
-    if os.path.exists(local) and os.path.getsize(local) > 0:
-        return local
-    return download_http(resolved, local)
+    return download_cached(resolved, existing)
+
+
+# Hoisted constants for the per-clip hot path in build_from_timeline
+_DEFAULT_POS = ("(W-w)/2", "(H-h)/2")
+_POS_TABLE = {
+    "top_left": ("40", "40"),
+    "top_right": ("W-w-40", "40"),
+    "bottom_left": ("40", "H-h-40"),
+    "bottom_right": ("W-w-40", "H-h-40"),
+    "center": ("(W-w)/2", "(H-h)/2"),
+    "top_center": ("(W-w)/2", "40"),
+    "bottom_center": ("(W-w)/2", "H-h-40"),
+    "left_center": ("40", "(H-h)/2"),
+    "right_center": ("W-w-40", "(H-h)/2"),
+}
+_IMG_EXT = frozenset((".jpg", ".jpeg", ".png", ".webp"))
+_FIT_FORCE_AR = {"cover": "decrease"}
+# Containers NVDEC can be asked to decode; ffmpeg falls back to software
+# decode on its own if the codec inside isn't supported.
+_HWDEC_EXT = frozenset((".mp4", ".m4v", ".mov", ".mkv", ".webm", ".ts"))
+# Codecs that can be stream-copied into an mp4 container without remuxing
+# surprises; anything else (vp9, mpeg2, ...) must go through the encode path.
+_MP4_COPY_CODECS = frozenset(("h264", "hevc", "mpeg4", "av1"))
+# Codecs every NVDEC-capable GPU this targets can decode in hardware. VP9/AV1
+# decode is generation-dependent: committing to -hwaccel_output_format cuda
+# for those would hand scale_cuda system-memory frames and fail the job.
+_NVDEC_CODECS = frozenset(("h264", "hevc"))
+HW_DECODE = os.getenv("HW_DECODE", "1").lower() in ("1", "true", "yes", "on")
+
+
+def _prepare_image(path: str, W: int, H: int, force_ar: str) -> Optional[str]:
+    """
+    Scale + letterbox a still once with Pillow so ffmpeg loops a frame that is
+    already WxH — otherwise swscale reprocesses FPS*duration identical frames.
+    Results are cached next to downloaded assets, keyed on (file, size, target).
+    Returns None when the image can't be prepared; callers keep the old chain.
+    """
+    try:
+        st = os.stat(path)
+        key = hashlib.blake2b(
+            f"{os.path.abspath(path)}|{st.st_mtime}|{st.st_size}|{W}x{H}|{force_ar}".encode(),
+            digest_size=16).hexdigest()
+        out = os.path.join(ASSET_CACHE_DIR, f"pre_{key}.png")
+        if os.path.exists(out):
+            return out
+        with Image.open(path) as im:
+            im = im.convert("RGBA")
+            iw, ih = im.size
+            factor = (min if force_ar == "decrease" else max)(W / iw, H / ih)
+            nw, nh = max(1, round(iw * factor)), max(1, round(ih * factor))
+            if (nw, nh) != (iw, ih):
+                im = im.resize((nw, nh), Image.LANCZOS)
+            # Opaque black canvas matches the pad=...:color=black chain; the
+            # pasted image keeps its own alpha for the overlay path
+            canvas = Image.new("RGBA", (W, H), (0, 0, 0, 255))
+            canvas.paste(im, ((W - nw) // 2, (H - nh) // 2))
+            os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+            part = f"{out}.part.{os.getpid()}"
+            canvas.save(part, "PNG")
+            os.rename(part, out)
+        return out
+    except Exception as e:
+        log.info("Image pre-scale failed for %s: %s", path, e)
+        return None
 
 
 def position_to_xy(position: Optional[str], W: int, H: int) -> Tuple[str, str]:
     if not position:
-        return "(W-w)/2", "(H-h)/2"
-    pos = position.lower()
-    table = {
-        "top_left": ("40", "40"),
-        "top_right": ("W-w-40", "40"),
-        "bottom_left": ("40", "H-h-40"),
-        "bottom_right": ("W-w-40", "H-h-40"),
-        "center": ("(W-w)/2", "(H-h)/2"),
-        "top_center": ("(W-w)/2", "40"),
-        "bottom_center": ("(W-w)/2", "H-h-40"),
-        "left_center": ("40", "(H-h)/2"),
-        "right_center": ("W-w-40", "(H-h)/2"),
-    }
-    return table.get(pos, ("(W-w)/2", "(H-h)/2"))
-
-
-def add_input(args_list: List[str], *tokens: str) -> None:
-    parts = list(tokens)
-    try:
-        i_idx = parts.index("-i")
-    except ValueError:
-        raise ValueError("add_input() requires an '-i <path>' token pair.")
-    inject = []
+        return _DEFAULT_POS
+    return _POS_TABLE.get(position.lower(), _DEFAULT_POS)
+
+
+# Default probe budgets by input kind. A looped still image has nothing to
+# analyze, and a known mp4/mov container needs far less than ffmpeg's 5 MB/5 s
+# default — that probe is pure open latency on jobs with many small assets.
+_PROBE_DEFAULTS = {
+    "image": ("32", "0"),
+    "video": ("200000", "200000"),
+}
+
+
+def add_input(args_list: List[str], path: str, *,
+              pre: Tuple[str, ...] = (), kind: Optional[str] = None) -> None:
+    """Append one input as [*pre, <per-input options>, -i, path] — no token scan."""
+    args_list += pre
     if INPUT_QUEUE_SIZE:
-        inject += ["-thread_queue_size", str(INPUT_QUEUE_SIZE)]
+        args_list += ["-thread_queue_size", str(INPUT_QUEUE_SIZE)]
+    probesize, analyze = _PROBE_DEFAULTS.get(kind, (None, None))
     if PROBE_SIZE:
-        inject += ["-probesize", str(PROBE_SIZE)]
+        probesize = PROBE_SIZE
     if ANALYZE_DURATION:
-        inject += ["-analyzeduration", str(ANALYZE_DURATION)]
-    parts[i_idx:i_idx] = inject
-    args_list += parts
+        analyze = ANALYZE_DURATION
+    if probesize is not None:
+        args_list += ["-probesize", str(probesize)]
+    if analyze is not None:
+        args_list += ["-analyzeduration", str(analyze)]
+    args_list += ["-i", path]
 
 
 def build_black_fallback(out_path: str, W: int, H: int, FPS: int) -> List[str]:
     ffmpeg = which("ffmpeg")
     if not ffmpeg:
         raise RuntimeError("ffmpeg not found in PATH")
-    print("[renderer] Using BLACK FALLBACK")
-    return [ffmpeg, "-y", "-hide_banner", "-f", "lavfi",
+    log.info("Using BLACK FALLBACK")
+    return [ffmpeg, "-y", "-hide_banner", "-nostats", "-f", "lavfi",
             "-i", f"color=c=black:s={W}x{H}:d=10", "-r", str(FPS),
             "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
             "-pix_fmt", "yuv420p", out_path]
 
 
 # ---------- Effects helpers ----------
-def apply_effects(chain: str, effects, W: int, H: int, FPS: int, dur: float, start: float, fade_in_start: int, index: int) -> str:
+def apply_effects(parts: List[str], effects, W: int, H: int, FPS: int, dur: float, start: float, fade_in_start: int, index: int) -> None:
     """
+    Append effect segments to a clip's chain parts; the caller joins once.
     Supports:
       - {"type":"zoom_in"} / {"type":"zoom_out"}
       - {"type":"fade","in":0.5,"out":0.5}
@@ -124,7 +364,6 @@ def apply_effects(chain: str, effects, W: int, H: int, FPS: int, dur: float, sta
     effs = effects or []
 
     # ---- Zoom
-    zoom_added = False
     for e in effs:
         e_t = (e.get("type") or "").lower()
         if e_t in ("zoom_in", "zoom_out"):
@@ -133,13 +372,12 @@ def apply_effects(chain: str, effects, W: int, H: int, FPS: int, dur: float, sta
 
             dframes = max(1, int(round(FPS * dur)))
             zexpr = f"{z_start}+({z_end - z_start})*(1-cos(PI*on/{dframes}))/2"
-            chain += (
-                f",zoompan=z='{zexpr}':"
+            parts.append(
+                f"zoompan=z='{zexpr}':"
                 f"x='iw/2-(iw/zoom)/2':"
                 f"y='ih/2-(ih/zoom)/2':"
                 f"d=1:s={W}x{H}:fps={FPS}"
             )
-            zoom_added = True
             break
 
     # ---- Fade
@@ -150,53 +388,169 @@ def apply_effects(chain: str, effects, W: int, H: int, FPS: int, dur: float, sta
             fade_out = float(e.get("out", 0.5))
 
     if fade_in:
-        chain += f",fade=t=in:st={fade_in_start}:d={fade_in:.3f}"
+        parts.append(f"fade=t=in:st={fade_in_start}:d={fade_in:.3f}")
     if fade_out:
-        chain += f",fade=t=out:st={max(0.0, dur-fade_out):.3f}:d={fade_out:.3f}"
+        parts.append(f"fade=t=out:st={max(0.0, dur-fade_out):.3f}:d={fade_out:.3f}")
+
+    # ---- End with fps/format, unless the base chain already does: each of
+    # these is a full memory pass over every frame, so don't emit them twice
+    if parts[-1] != "format=yuva420p":
+        parts.append(f"fps={FPS}")
+        parts.append("format=yuva420p")
+
 
-    # ---- Always end with fps/format
-    chain += f",fps={FPS},format=yuva420p"
-    return chain
+# (x, y) expression templates per slide direction; {ts}/{d} are the slide
+# start time and duration. Unknown directions fall back to centered.
+_SLIDE_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "up": ("(W-w)/2", "H-((t-{ts})/{d})*H"),
+    "down": ("(W-w)/2", "-H+((t-{ts})/{d})*H"),
+    "left": ("W-((t-{ts})/{d})*W", "(H-h)/2"),
+    "right": ("-W+((t-{ts})/{d})*W", "(H-h)/2"),
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _slide_expr(direction: str, t_start: float, dur_slide: float) -> Tuple[str, str]:
+    tmpl = _SLIDE_TEMPLATES.get(direction)
+    if tmpl is None:
+        return _DEFAULT_POS
+    return (tmpl[0].format(ts=t_start, d=dur_slide),
+            tmpl[1].format(ts=t_start, d=dur_slide))
 
 
 def _build_slide_expr(e: dict, W: int, H: int, start: float, dur: float) -> Tuple[str, str]:
     direction = (e.get("direction") or "up").lower()
     dur_slide = float(e.get("duration", 1.0))
     t_start = start if e["type"].lower() == "slide_in" else (start + dur - dur_slide)
-
-    if direction == "up":
-        return ("(W-w)/2", f"H-((t-{t_start})/{dur_slide})*H")
-    elif direction == "down":
-        return ("(W-w)/2", f"-H+((t-{t_start})/{dur_slide})*H")
-    elif direction == "left":
-        return (f"W-((t-{t_start})/{dur_slide})*W", "(H-h)/2")
-    elif direction == "right":
-        return (f"-W+((t-{t_start})/{dur_slide})*W", "(H-h)/2")
-    return ("(W-w)/2", "(H-h)/2")
+    return _slide_expr(direction, t_start, dur_slide)
 
 
 def _escape_sub_path(p: str) -> str:
     return p.replace("\\", "\\\\").replace(":", r"\:").replace("'", r"\'").replace(",", r"\,")
 
 
+# Persistent so repeat jobs with the same subtitle file skip the ffmpeg fork;
+# workdirs are deleted per job and would never get a cache hit.
+_SUB_CACHE_DIR = os.getenv("SUB_CACHE_DIR", "/tmp/subcache")
+
+
 def _maybe_convert_vtt_to_srt(src_path: str, workdir: str) -> str:
-    base = os.path.splitext(os.path.basename(src_path))[0]
-    out_srt = os.path.join(workdir, f"{base}.srt")
+    try:
+        with open(src_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    except OSError:
+        return src_path
+    out_srt = os.path.join(_SUB_CACHE_DIR, f"{digest}.srt")
+    if os.path.exists(out_srt):
+        return out_srt
     ffmpeg = which("ffmpeg")
     if not ffmpeg:
         return src_path
-    proc = run_cmd_capture([ffmpeg, "-y", "-hide_banner", "-i", src_path, out_srt])
-    if proc.returncode == 0 and os.path.exists(out_srt):
+    os.makedirs(_SUB_CACHE_DIR, exist_ok=True)
+    part = f"{out_srt}.part.{os.getpid()}"
+    proc = run_cmd_capture([ffmpeg, "-y", "-hide_banner", "-nostats",
+                            "-i", src_path, "-f", "srt", part])
+    if proc.returncode == 0 and os.path.exists(part):
+        os.rename(part, out_srt)
         return out_srt
+    if os.path.exists(part):
+        os.remove(part)
     return src_path
 
 
+def _try_concat_copy(vclips: List[dict], aclips: List[dict], subs: List[dict],
+                     assets: Dict[str, str], workdir: str, out_path: str,
+                     W: int, H: int, FPS: int, ffmpeg: str) -> Optional[List[str]]:
+    """
+    Stream-copy fast path: when every clip is a plain video already matching
+    the target W/H/FPS (no effects, overlays, opacity, audio or subtitles),
+    the filter graph would only re-encode identical frames. Use the concat
+    demuxer with -c copy instead — no decode, no encode.
+    """
+    if not vclips or aclips or subs:
+        return None
+    entries = []
+    streams = set()
+    for c in vclips:
+        if c.get("effects") or c.get("position") or c.get("opacity") is not None:
+            return None
+        path = assets.get(c["src"]) or c["src"]
+        if os.path.splitext(path)[1].lower() in _IMG_EXT:
+            return None
+        params = probe_video_params(path)
+        if params is None:
+            return None
+        w, h, fps, codec, pix_fmt = params
+        if w != W or h != H or abs(fps - FPS) > 0.01:
+            return None
+        # Concatenated streams must share one mp4-safe codec and pixel format;
+        # mixed codecs would stream-copy into a silently corrupt file
+        if codec not in _MP4_COPY_CODECS:
+            return None
+        streams.add((codec, pix_fmt))
+        if len(streams) > 1:
+            return None
+        entries.append((path, float(c.get("length") or 0.0)))
+
+    list_path = os.path.join(workdir, "concat.txt")
+    with open(list_path, "w") as fh:
+        for path, length in entries:
+            fh.write(f"file '{os.path.abspath(path)}'\n")
+            if length > 0:
+                fh.write(f"outpoint {length:.3f}\n")
+    log.info("All clips pre-normalized; using concat demuxer stream copy")
+    # -an: the graph path this replaces maps video only when there are no
+    # audio clips, so embedded source audio must not leak into the output
+    return [ffmpeg, "-y", "-hide_banner", "-nostats", "-f", "concat", "-safe", "0",
+            "-i", list_path, "-c", "copy", "-an", out_path]
+
+
+def _try_gpu_direct(vclips: List[dict], aclips: List[dict], subs: List[dict],
+                    assets: Dict[str, str], out_path: str,
+                    W: int, H: int, FPS: int, ffmpeg: str) -> Optional[List[str]]:
+    """
+    Fully on-GPU fast path: a single plain video clip that only needs scaling
+    can stay device-resident across decode -> scale_cuda -> NVENC, with no
+    frame copies through system memory. The general graph can't do this —
+    zoompan/fade/overlay/subtitles and the yuva420p alpha format are CPU-only
+    filters — so this covers the common "re-render one source to target size"
+    job and everything else takes the normal path.
+    """
+    if not HW_DECODE or len(vclips) != 1 or aclips or subs:
+        return None
+    c = vclips[0]
+    if c.get("effects") or c.get("position") or c.get("opacity") is not None:
+        return None
+    path = assets.get(c["src"]) or c["src"]
+    if os.path.splitext(path)[1].lower() not in _HWDEC_EXT:
+        return None
+    params = probe_video_params(path)
+    if params is None:
+        return None
+    w, h, _, codec, _ = params
+    # Hard-committing to CUDA frames only works when NVDEC actually decodes
+    # this stream; otherwise software decode feeds scale_cuda CPU frames
+    if codec not in _NVDEC_CODECS:
+        return None
+    # scale_cuda has no companion pad filter; require a matching aspect ratio
+    if abs(w * H - h * W) > max(W, H):
+        return None
+    dur = max(0.01, float(c.get("length") or 0.01))
+    log.info("Single plain clip; using device-resident NVDEC->scale_cuda->NVENC path")
+    return [ffmpeg, "-y", "-hide_banner", "-nostats",
+            "-hwaccel", "cuda", "-hwaccel_output_format", "cuda", "-extra_hw_frames", "8",
+            "-ss", "0", "-t", f"{dur:.3f}", "-i", path,
+            "-vf", f"scale_cuda={W}:{H}:format=yuv420p",
+            "-c:v", "h264_nvenc", "-preset", "p5", "-rc", "vbr", "-cq", "23",
+            "-b:v", "6M", "-maxrate", "8M", "-bufsize", "12M",
+            "-r", str(FPS), "-an", out_path]
+
+
 # ---------- Timeline builder ----------
 def build_from_timeline(data: dict, workdir: str, out_path: str,
                         W: int, H: int, FPS: int, prefer_nvenc: bool) -> List[str]:
-    vclips = extract_timeline_clips(data)
-    aclips = extract_timeline_audio(data)
-    subs   = extract_timeline_subtitles(data)
+    vclips, aclips = extract_timeline_all(data)
+    subs = extract_timeline_subtitles(data)
 
     if not vclips and not aclips and not subs:
         return build_black_fallback(out_path, W, H, FPS)
@@ -209,6 +563,26 @@ def build_from_timeline(data: dict, workdir: str, out_path: str,
     if total_dur <= 0:
         total_dur = 10.0
 
+    assets = prefetch_assets(vclips + aclips + subs, workdir)
+
+    ffmpeg = which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found in PATH")
+
+    use_nvenc = True
+    # if not FORCE_CPU and prefer_nvenc:
+    #     if has_nvenc_encoder(ffmpeg) and (FORCE_NVENC or nvenc_usable(ffmpeg)):
+    #         use_nvenc = True
+
+    copy_cmd = _try_concat_copy(vclips, aclips, subs, assets, workdir, out_path, W, H, FPS, ffmpeg)
+    if copy_cmd:
+        return copy_cmd
+
+    if use_nvenc:
+        gpu_cmd = _try_gpu_direct(vclips, aclips, subs, assets, out_path, W, H, FPS, ffmpeg)
+        if gpu_cmd:
+            return gpu_cmd
+
     inputs: List[str] = []
     filters: List[str] = []
     input_idx = 0
@@ -216,63 +590,135 @@ def build_from_timeline(data: dict, workdir: str, out_path: str,
     base_labels: List[str] = []
     overlays: List[tuple] = []   # (label, x, y, start, dur, effects)
 
-    for i, c in enumerate(vclips):
-        path = download_asset(c["src"], workdir)
-        is_image = path.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    # Pre-pass: resolve each clip and register one ffmpeg input per unique
+    # (path + decode options) tuple. Repeated sources are opened and decoded
+    # once; split fans the decoded stream out to every consumer.
+    clip_meta: List[tuple] = []
+    input_specs: List[Tuple[Tuple[str, ...], str, Optional[str]]] = []  # (pre, path, kind)
+    spec_index: Dict[Tuple[Tuple[str, ...], str], int] = {}
+    for c in vclips:
+        path = assets.get(c["src"]) or download_asset(c["src"], workdir)
+        is_image = os.path.splitext(path)[1].lower() in _IMG_EXT
         dur = max(0.01, float(c.get("length") or 0.01))
         start = float(c.get("start", 0.0))
-        fit_mode = (c.get("fit") or "cover").lower()
-        force_ar = "decrease" if fit_mode == "cover" else "increase"
+        force_ar = _FIT_FORCE_AR.get((c.get("fit") or "cover").lower(), "increase")
         fade_in_start = 0
+        prescaled = False
 
         if is_image:
             if c.get("position"):
                 dur = start + dur
                 fade_in_start = start
-            
-            add_input(inputs, "-loop", "1", "-t", f"{dur:.3f}", "-i", path)
-            vin = f"[{input_idx}:v]"
-
-            chain = (
-                f"{vin}"
-                f"scale={W}:{H}:force_original_aspect_ratio={force_ar},"
-                f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2:color=black,"
-                f"setsar=1,"
-                f"trim=duration={dur},setpts=PTS-STARTPTS"
-            )
-            chain = apply_effects(chain, c.get("effects"), W, H, FPS, dur, start, fade_in_start, i)
-
-            if c.get("position"):
-                chain += f"[ovl{i}]"
-                filters.append(chain)
-                x, y = position_to_xy(c.get("position"), W, H)
-                overlays.append((f"[ovl{i}]", x, y, start, dur, c.get("effects") or []))
-            else:
-                chain += f"[b{i}]"
-                filters.append(chain)
-                base_labels.append(f"[b{i}]")
+            prepared = _prepare_image(path, W, H, force_ar)
+            if prepared:
+                path = prepared
+                prescaled = True
+            pre = ("-loop", "1", "-t", f"{dur:.3f}")
+            kind = "image"
         else:
+            # NVDEC decode on the NVENC path: frames come back to system memory
+            # because the graph below uses CPU-only filters (zoompan/fade/overlay/
+            # subtitles), but decode itself moves off the CPU.
+            hwdec = ("-hwaccel", "cuda") if (
+                use_nvenc and HW_DECODE and os.path.splitext(path)[1].lower() in _HWDEC_EXT
+            ) else ()
             if (c.get("length") or 0) > 0:
-                add_input(inputs, "-ss", "0", "-t", f"{dur:.3f}", "-i", path)
+                pre = (*hwdec, "-ss", "0", "-t", f"{dur:.3f}")
             else:
-                add_input(inputs, "-i", path)
-            vin = f"[{input_idx}:v]"
-            chain = (
-                f"{vin}"
-                f"trim=duration={dur},setpts=PTS-STARTPTS,"
-                f"scale={W}:{H}:force_original_aspect_ratio={force_ar},"
-                f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2:color=black,"
-                f"setsar=1,fps={FPS},format=yuva420p"
-            )
+                pre = hwdec
+            kind = "video" if os.path.splitext(path)[1].lower() in _HWDEC_EXT else None
+
+        idx = spec_index.get((pre, path))
+        if idx is None:
+            idx = len(input_specs)
+            spec_index[(pre, path)] = idx
+            input_specs.append((pre, path, kind))
+        clip_meta.append((c, is_image, dur, start, force_ar, fade_in_start, idx, prescaled))
+
+    for pre, path, kind in input_specs:
+        add_input(inputs, path, pre=pre, kind=kind)
+    input_idx = len(input_specs)
+
+    # Second pass: compute each clip's full chain body (label-free) so that
+    # identical processing of the same input can be emitted once and shared.
+    chain_bodies: List[str] = []
+    consumer_labels: List[str] = []
+    for i, (c, is_image, dur, start, force_ar, fade_in_start, idx, prescaled) in enumerate(clip_meta):
+        if is_image and prescaled:
+            # Frame already rendered at WxH by Pillow; nothing left to scale
+            parts = [
+                "setsar=1",
+                f"trim=duration={dur}",
+                "setpts=PTS-STARTPTS",
+            ]
+        elif is_image:
+            # Build the chain as segments and join once: no quadratic str concat
+            parts = [
+                f"scale={W}:{H}:force_original_aspect_ratio={force_ar}",
+                f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2:color=black",
+                "setsar=1",
+                f"trim=duration={dur}",
+                "setpts=PTS-STARTPTS",
+            ]
+        else:
+            parts = [
+                f"trim=duration={dur}",
+                "setpts=PTS-STARTPTS",
+            ]
+            # Elide scaler nodes the probe proves are no-ops: every skipped
+            # filter is one fewer full-frame memory pass on this chain
+            src = probe_video_params(input_specs[idx][1])
+            if src and (src[0], src[1]) == (W, H):
+                pass  # already target size; scale and pad would pass through
+            elif src and abs(src[0] * H - src[1] * W) <= max(W, H):
+                parts.append(f"scale={W}:{H}")  # aspect matches: no letterbox
+            else:
+                parts.append(f"scale={W}:{H}:force_original_aspect_ratio={force_ar}")
+                parts.append(f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2:color=black")
+            parts += [
+                "setsar=1",
+                f"fps={FPS}",
+                "format=yuva420p",
+            ]
             if c.get("opacity") is not None:
                 alpha = max(0.0, min(1.0, float(c["opacity"])))
-                chain += f",colorchannelmixer=aa={alpha}"
-            chain = apply_effects(chain, c.get("effects"), W, H, FPS, dur, start, fade_in_start , i)
-            chain += f"[b{i}]"
-            filters.append(chain)
+                parts.append(f"colorchannelmixer=aa={alpha}")
+        apply_effects(parts, c.get("effects"), W, H, FPS, dur, start, fade_in_start, i)
+        chain_bodies.append(",".join(parts))
+
+        if is_image and c.get("position"):
+            consumer_labels.append(f"[ovl{i}]")
+            x, y = position_to_xy(c.get("position"), W, H)
+            overlays.append((f"[ovl{i}]", x, y, start, dur, c.get("effects") or []))
+        else:
+            consumer_labels.append(f"[b{i}]")
             base_labels.append(f"[b{i}]")
 
-        input_idx += 1
+    # Group clips with an identical (input, chain) pair: the shared subgraph
+    # runs once and a split hands each consumer its own label
+    groups: Dict[Tuple[int, str], List[int]] = {}
+    for i, meta in enumerate(clip_meta):
+        groups.setdefault((meta[6], chain_bodies[i]), []).append(i)
+
+    distinct_per_input = collections.Counter(idx for idx, _ in groups)
+    vin_labels: Dict[int, List[str]] = {}
+    for idx in range(len(input_specs)):
+        m = distinct_per_input[idx]
+        if m == 1:
+            vin_labels[idx] = [f"[{idx}:v]"]
+        else:
+            outs = [f"[src{idx}_{k}]" for k in range(m)]
+            filters.append(f"[{idx}:v]split={m}{''.join(outs)}")
+            vin_labels[idx] = outs
+
+    for g, ((idx, body), members) in enumerate(groups.items()):
+        vin = vin_labels[idx].pop(0)
+        if len(members) == 1:
+            filters.append(f"{vin}{body}{consumer_labels[members[0]]}")
+        else:
+            filters.append(f"{vin}{body}[sh{g}]")
+            outs = "".join(consumer_labels[i] for i in members)
+            filters.append(f"[sh{g}]split={len(members)}{outs}")
 
     vmap = None
     if base_labels:
@@ -302,36 +748,55 @@ def build_from_timeline(data: dict, workdir: str, out_path: str,
 
     # AUDIO
     audio_labels: List[str] = []
-    for j, a in enumerate(aclips):
-        path = download_asset(a["src"], workdir)
+    audio_copy = None
+    if len(aclips) == 1:
+        a = aclips[0]
+        vol = float(a["volume"]) if a.get("volume") is not None else 1.0
+        if vol == 1.0 and float(a.get("start", 0.0)) == 0.0:
+            path = assets.get(a["src"]) or download_asset(a["src"], workdir)
+            params = probe_audio_params(path)
+            if params and params[0] == "aac":
+                # Already AAC, no gain or offset to apply: map the stream
+                # untouched and stream-copy it, skipping the whole audio
+                # decode+filter+encode pipeline.
+                dur = max(0.01, float(a.get("length") or 0.01))
+                add_input(inputs, path, pre=("-ss", "0", "-t", f"{dur:.3f}"))
+                audio_copy = f"{input_idx}:a"
+                input_idx += 1
+    for j, a in enumerate([] if audio_copy else aclips):
+        path = assets.get(a["src"]) or download_asset(a["src"], workdir)
         dur = max(0.01, float(a.get("length") or 0.01))
         start = float(a.get("start", 0.0))
-        start_ms = max(0, int(round(start * 1000)))
         vol = float(a["volume"]) if a.get("volume") is not None else 1.0
-        add_input(inputs, "-ss", "0", "-t", f"{dur:.3f}", "-i", path)
+        # Shift the clip at demux time via -itsoffset instead of copying every
+        # sample through adelay; first_pts=0 makes the resampler pad real
+        # silence up to the shifted first PTS, since amix consumes samples
+        # without aligning on timestamps. atrim then bounds the padded stream.
+        add_input(inputs, path, pre=("-itsoffset", f"{start:.3f}", "-ss", "0", "-t", f"{dur:.3f}"))
         ain = f"[{input_idx}:a]"
         chain = (
             f"{ain}"
-            f"aresample=async=1,volume={vol},atrim=0:{dur:.6f},asetpts=PTS-STARTPTS,"
-            f"adelay={start_ms}|{start_ms}[a{j}]"
+            f"aresample=async=1:first_pts=0,volume={vol},atrim=0:{start + dur:.6f}[a{j}]"
         )
         filters.append(chain)
         audio_labels.append(f"[a{j}]")
         input_idx += 1
 
     amap = None
-    if audio_labels:
+    if audio_copy:
+        amap = audio_copy
+    elif audio_labels:
         if len(audio_labels) == 1:
             amap = audio_labels[0]
         else:
-            filters.append(f"{''.join(audio_labels)}amix=inputs={len(audio_labels)}:normalize=0:dropout_transition=0[aout]")
+            filters.append(f"{''.join(audio_labels)}amix=inputs={len(audio_labels)}:duration=longest:normalize=0:dropout_transition=0[aout]")
             amap = "[aout]"
 
     if vmap:
         subs_list = subs or []
         if subs_list:
             s = subs_list[0]
-            s_local = download_asset(s["src"], workdir)
+            s_local = assets.get(s["src"]) or download_asset(s["src"], workdir)
             low = s_local.lower()
             if low.endswith(".vtt"):
                 s_local = _maybe_convert_vtt_to_srt(s_local, workdir)
@@ -341,19 +806,19 @@ def build_from_timeline(data: dict, workdir: str, out_path: str,
                 filters.append(f"{vmap}subtitles='{esc}'[vsub]")
                 vmap = "[vsub]"
 
-    ffmpeg = which("ffmpeg")
-    if not ffmpeg:
-        raise RuntimeError("ffmpeg not found in PATH")
-
-    use_nvenc = True
-    # if not FORCE_CPU and prefer_nvenc:
-    #     if has_nvenc_encoder(ffmpeg) and (FORCE_NVENC or nvenc_usable(ffmpeg)):
-    #         use_nvenc = True
-
-    cmd: List[str] = [ffmpeg, "-y", "-hide_banner"]
+    cmd: List[str] = [ffmpeg, "-y", "-hide_banner", "-nostats"]
     cmd += inputs
     if filters:
-        cmd += ["-filter_complex", ";".join(filters)]
+        graph = ";".join(filters)
+        if len(graph) > 8192:
+            # Big timelines can push argv toward ARG_MAX; hand ffmpeg a script
+            # file instead of a giant command-line token
+            script = os.path.join(workdir, "filtergraph.txt")
+            with open(script, "w") as fh:
+                fh.write(";\n".join(filters))
+            cmd += ["-filter_complex_script", script]
+        else:
+            cmd += ["-filter_complex", graph]
     if vmap:
         cmd += ["-map", vmap]
     if amap:
@@ -363,9 +828,12 @@ def build_from_timeline(data: dict, workdir: str, out_path: str,
                "-b:v", "6M", "-maxrate", "8M", "-bufsize", "12M"]
               if use_nvenc else
               ["-c:v", "libx264", "-preset", "medium", "-crf", "20"])
+    if not use_nvenc:
+        # Share cores between concurrent CPU jobs instead of oversubscribing
+        vcodec += ["-threads", str(max(1, (os.cpu_count() or 4) // MAX_CONCURRENT_JOBS))]
     cmd += vcodec + ["-r", str(FPS), "-pix_fmt", "yuv420p"]
     if amap:
-        cmd += ["-c:a", "aac", "-b:a", "192k"]
+        cmd += ["-c:a", "copy"] if audio_copy else ["-c:a", "aac", "-b:a", "192k"]
     cmd += ["-shortest", out_path]
     return cmd
 
@@ -377,20 +845,68 @@ def build_ffmpeg_cmd(payload: RenderPayload, workdir: str, out_path: str) -> Lis
         raise RuntimeError("ffmpeg not found in PATH")
     prefer_nvenc = (payload.output.codec or "").lower() == "h264_nvenc" or FORCE_NVENC
     raw = getattr(payload, "_raw_dict", None)
+    is_timeline = getattr(payload, "_is_timeline", None)
     if raw is None:
         try:
             raw = payload.model_dump()
         except Exception:
             raw = {}
-    if is_timeline_payload(raw):
+    if is_timeline is None:
+        # Payload didn't come through to_payload_model_with_raw; classify here
+        is_timeline = is_timeline_payload(raw)
+    if is_timeline:
         return build_from_timeline(raw, workdir, out_path, W, H, FPS, prefer_nvenc)
     return build_black_fallback(out_path, W, H, FPS)
 
 
+def _decode_log_tail(logs: "collections.deque[bytes]") -> str:
+    return "\n".join(b.rstrip(b"\r").decode("utf-8", "replace") for b in logs)
+
+
 def run_ffmpeg(cmd: List[str]) -> tuple[int, str]:
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    logs: List[str] = []
-    for line in proc.stdout:
-        logs.append(line.rstrip())
+    # Binary pipe with a large buffer: one read() per 64 KB instead of one per
+    # log line, and a bounded ring buffer so verbose encodes can't pile up
+    # megabytes of log strings (or stall ffmpeg on a full stderr pipe).
+    # start_new_session puts ffmpeg (and any children) in its own process
+    # group so a timeout/cancel can kill the whole group without reaping
+    # stray forks, and a Ctrl-C to the worker doesn't hit ffmpeg directly.
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            bufsize=1 << 20, start_new_session=True)
+    logs: collections.deque = collections.deque(maxlen=400)
+    fd = proc.stdout.fileno()
+    pending = b""
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        logs.extend(lines)
+    if pending:
+        logs.append(pending)
     proc.wait()
-    return proc.returncode, "\n".join(logs[-400:])
+    return proc.returncode, _decode_log_tail(logs)
+
+
+async def run_ffmpeg_async(cmd: List[str]) -> tuple[int, str]:
+    """
+    Same contract as run_ffmpeg, but the subprocess is only supervised: the
+    event loop is free to run other tasks (upload prep, more ffmpeg processes)
+    while this one drains the pipe.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        limit=1 << 20, start_new_session=True)
+    logs: collections.deque = collections.deque(maxlen=400)
+    pending = b""
+    while True:
+        chunk = await proc.stdout.read(65536)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        logs.extend(lines)
+    if pending:
+        logs.append(pending)
+    rc = await proc.wait()
+    return rc, _decode_log_tail(logs)
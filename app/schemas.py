@@ -1,5 +1,7 @@
-from typing import List, Optional, Dict, Any, Union
-from pydantic import BaseModel, Field, HttpUrl, ConfigDict
+from typing import Annotated, List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Discriminator, Field, HttpUrl, ConfigDict, Tag, TypeAdapter
+
+from .parser import is_timeline_payload
 
 # =========================
 # Internal (legacy) schema
@@ -21,7 +23,6 @@ class Clip(BaseModel):
     position: Optional[str] = None
     opacity: Optional[float] = None
     fit: Optional[str] = None
-    position: str
 
 class Track(BaseModel):
     # "video" | "image" | "overlay" | "subtitle" | "audio"
@@ -96,6 +97,24 @@ class TimelineRoot(BaseModel):
     output: Optional[Dict[str, Any]] = None
     canvas: Optional[CanvasSpec] = None
 
+# =========================
+# Payload dispatch
+# =========================
+def _payload_tag(data: Any) -> str:
+    """Discriminator: classify a raw dict once instead of try/except per variant."""
+    return "timeline" if is_timeline_payload(data) else "internal"
+
+Payload = Annotated[
+    Union[
+        Annotated[RenderPayload, Tag("internal")],
+        Annotated[TimelineRoot, Tag("timeline")],
+    ],
+    Discriminator(_payload_tag),
+]
+
+# Module-level adapter so the core schema is built once, not per request
+PAYLOAD_ADAPTER: TypeAdapter = TypeAdapter(Payload)
+
 # =========================
 # Request / Response
 # =========================
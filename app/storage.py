@@ -1,3 +1,4 @@
+import functools
 import os
 from urllib.parse import urljoin
 import boto3
@@ -8,10 +9,19 @@ S3_REGION = os.getenv("S3_REGION", "us-west-2")
 S3_PREFIX = os.getenv("S3_PREFIX", "renders/")
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL")
 
+@functools.lru_cache(maxsize=1)
+def get_s3_client():
+    return boto3.client("s3", region_name=S3_REGION, config=Config(signature_version="s3v4"))
+
+def prepare_upload_target() -> None:
+    """Warm the S3 client (credential resolution + endpoint setup) ahead of upload."""
+    if S3_BUCKET:
+        get_s3_client()
+
 def upload_if_configured(local_path: str) -> str:
     if S3_BUCKET:
         key = f"{S3_PREFIX}{os.path.basename(local_path)}"
-        s3 = boto3.client("s3", region_name=S3_REGION, config=Config(signature_version="s3v4"))
+        s3 = get_s3_client()
         s3.upload_file(local_path, S3_BUCKET, key, ExtraArgs={"ACL": "public-read", "ContentType": "video/mp4"})
         if PUBLIC_BASE_URL:
             return urljoin(PUBLIC_BASE_URL.rstrip("/") + "/", key)
@@ -1,21 +1,44 @@
-import os, tempfile, requests
+import os, shutil, tempfile, requests
+import msgspec
+from requests.adapters import HTTPAdapter, Retry
 from urllib.parse import urlparse
 
+# One pooled session for every HTTP fetch in the app: keep-alive reuses
+# sockets so repeat downloads from the same CDN skip the TCP/TLS handshake.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50,
+                       max_retries=Retry(total=3, backoff_factor=0.2))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# C-level JSON decoder: parses the response bytes directly, no intermediate
+# str and no per-node Python dispatch like json.loads
+_JSON_DECODER = msgspec.json.Decoder()
+
 ASSETS_ROOT = "/workspace/assets"           # e.g., /workspace/assets  (Pods) or /tmp/assets (Serverless)
 ASSET_URL_PREFIX = os.getenv("ASSET_URL_PREFIX") # e.g., https://my-cdn.example.com/assets/
 DEFAULT_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "300"))
 
+def stat_or_none(path: str):
+    """One stat() syscall answering both the exists and the size question."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
 def safe_filename_from_url(url: str) -> str:
     base = os.path.basename(urlparse(url).path) or "asset"
     return base.split("?")[0]
 
 def download_to(path: str, url: str) -> str:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with requests.get(url, stream=True, timeout=60) as r:
+    # Copy straight off the raw stream in 1 MiB chunks — same pattern as the
+    # renderer's downloads: few syscalls, no per-chunk generator overhead.
+    with SESSION.get(url, stream=True, timeout=60) as r:
         r.raise_for_status()
+        r.raw.decode_content = True
         with open(path, "wb") as f:
-            for chunk in r.iter_content(1 << 20):
-                f.write(chunk)
+            shutil.copyfileobj(r.raw, f, length=1 << 20)
     return path
 
 def _asset_local_path(name_or_path: str) -> str:
@@ -41,27 +64,27 @@ def resolve_asset_src(src: str) -> str:
     # 1) asset:// schema -> local path under ASSETS_ROOT
     if src.startswith("asset://"):
         local = _asset_local_path(src)
-        if os.path.exists(local):
+        if stat_or_none(local) is not None:
             return local
         # optional: fallback to CDN prefix if present
         if ASSET_URL_PREFIX:
             return ASSET_URL_PREFIX.rstrip("/") + "/" + src[len("asset://"):]
         return src  # let renderer download if it's a URL
     # 2) local file path
-    if os.path.exists(src):
+    if stat_or_none(src) is not None:
         return src
     # 3) optional remap plain filenames when ASSETS_ROOT is set
     if ASSETS_ROOT and "://" not in src and not src.startswith("/"):
         candidate = os.path.join(ASSETS_ROOT, src)
-        if os.path.exists(candidate):
+        if stat_or_none(candidate) is not None:
             return candidate
     return src  # likely http(s) or something the renderer can handle
 
 
 def fetch_payload(payload_url: str) -> dict:
-    r = requests.get(payload_url, timeout=60)
+    r = SESSION.get(payload_url, timeout=60)
     r.raise_for_status()
-    return r.json()
+    return _JSON_DECODER.decode(r.content)
 
 def tmpdir(prefix="job_") -> str:
     return tempfile.mkdtemp(prefix=prefix)
@@ -0,0 +1,159 @@
+import asyncio
+import os, json, shutil, threading, time
+from typing import Any, Dict, Optional
+
+import dramatiq
+import redis
+from dramatiq.brokers.redis import RedisBroker
+from dramatiq.middleware import Middleware
+from pydantic import ValidationError
+
+from .parser import is_timeline_payload
+from .schemas import PAYLOAD_ADAPTER, JobStatus, RenderPayload
+from .utils import tmpdir
+from .renderer import (
+    MAX_CONCURRENT_JOBS,
+    build_ffmpeg_cmd,
+    run_ffmpeg_async,
+    which,
+    has_nvenc_encoder,
+    nvenc_usable,
+)
+from .storage import prepare_upload_target, upload_if_configured
+from .log import get_logger
+
+log = get_logger("render.worker")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+JOB_TTL = int(os.getenv("JOB_TTL", str(7 * 24 * 3600)))  # seconds a finished job stays queryable
+BASE_URL = os.getenv("BASE_URL", "https://xiff2j86qmsii8-8080.proxy.runpod.net")
+
+class EncoderWarmup(Middleware):
+    """
+    Worker processes are long-lived, so pay NVENC/CUDA init once at boot:
+    nvenc_usable runs a real (cached) test encode, which brings up the driver
+    stack before the first job instead of on its critical path.
+    """
+    def after_worker_boot(self, broker, worker):
+        ffmpeg = which("ffmpeg")
+        if ffmpeg and has_nvenc_encoder(ffmpeg):
+            nvenc_usable(ffmpeg)
+
+
+broker = RedisBroker(url=REDIS_URL)
+broker.add_middleware(EncoderWarmup())
+dramatiq.set_broker(broker)
+
+REDIS = redis.Redis.from_url(REDIS_URL)
+
+# Bounds simultaneous ffmpeg runs when the worker is started with >1 thread
+_JOB_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_JOBS)
+
+
+def save_job(job: JobStatus) -> None:
+    REDIS.set(f"job:{job.id}", job.model_dump_json(), ex=JOB_TTL)
+
+
+def load_job(job_id: str) -> Optional[JobStatus]:
+    raw = REDIS.get(f"job:{job_id}")
+    if not raw:
+        return None
+    return JobStatus(**json.loads(raw))
+
+
+def to_payload_model_with_raw(data: Dict[str, Any]) -> RenderPayload:
+    """
+    Always attach the original dict as _raw_dict so the renderer can decide.
+    If it's not our internal schema, renderer can still branch using the raw dict.
+    """
+    # Classify from the raw dict, not from validation success: the parser
+    # accepts shapes the strict models reject (bare top-level tracks, tracks
+    # with one malformed clip) and timeline payloads render from _raw_dict
+    is_timeline = is_timeline_payload(data)
+    try:
+        model = PAYLOAD_ADAPTER.validate_python(data)
+    except ValidationError:
+        model = RenderPayload()
+    if not isinstance(model, RenderPayload):
+        # Timeline payloads render from the raw dict; defaults carry the output spec
+        model = RenderPayload()
+    setattr(model, "_raw_dict", data)
+    setattr(model, "_is_timeline", is_timeline)
+    return model
+
+
+def _stage_path(job_id: str, out_file: str) -> str:
+    """ffmpeg writes here; the file only appears under /outputs once complete."""
+    ext = os.path.splitext(out_file)[1] or ".mp4"
+    if os.path.isdir("/dev/shm"):
+        return f"/dev/shm/{job_id}{ext}"
+    return f"{out_file}.stage"
+
+
+def _publish_output(stage: str, out_file: str) -> None:
+    try:
+        os.replace(stage, out_file)
+    except OSError:
+        # /dev/shm and OUTPUT_DIR usually sit on different filesystems; copy to
+        # a sibling temp file and rename so StaticFiles never serves a partial
+        tmp = f"{out_file}.tmp.{os.getpid()}"
+        shutil.copyfile(stage, tmp)
+        os.replace(tmp, out_file)
+        os.remove(stage)
+
+
+async def _render_with_upload_prep(cmd) -> tuple:
+    # Warm the upload client while ffmpeg runs instead of after it exits
+    prep = asyncio.create_task(asyncio.to_thread(prepare_upload_target))
+    try:
+        return await run_ffmpeg_async(cmd)
+    finally:
+        await prep
+
+
+@dramatiq.actor(max_retries=0)
+def render_job(job_id: str, raw_data: Dict[str, Any], out_file: str) -> None:
+    job = load_job(job_id) or JobStatus(id=job_id, status="queued", generation_time=0)
+    job.status = "running"
+    save_job(job)
+
+    payload = to_payload_model_with_raw(raw_data)
+    file_name = os.path.basename(out_file)
+    workdir = tmpdir(prefix=f"{job_id}_")
+    stage = _stage_path(job_id, out_file)
+    try:
+        cmd = build_ffmpeg_cmd(payload, workdir, stage)
+        log.info("ffmpeg cmd: %s", " ".join(cmd))
+
+        with _JOB_SLOTS:
+            # start timer
+            start_time = time.time()
+            rc, logs = asyncio.run(_render_with_upload_prep(cmd))
+            end_time = time.time()
+
+        generation_time = round(end_time - start_time, 2)
+
+        if rc != 0:
+            job.status = "failed"
+            job.message = f"FFmpeg exited with {rc}"
+            job.logs = logs
+            job.generation_time = generation_time
+            save_job(job)
+            return
+
+        _publish_output(stage, out_file)
+        upload_if_configured(out_file)
+        job.status = "success"
+        job.output_url = f"{BASE_URL}/outputs/{file_name}"
+        job.logs = logs
+        job.generation_time = generation_time
+        save_job(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.message = f"Error: {e}"
+        save_job(job)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if os.path.exists(stage):
+            os.remove(stage)
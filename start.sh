@@ -1,8 +1,21 @@
 #!/bin/bash
 set -e
 
+# Redis backs the job store and the Dramatiq broker. Start the bundled
+# server unless REDIS_URL points at an external instance.
+REDIS_URL="${REDIS_URL:-redis://localhost:6379/0}"
+case "$REDIS_URL" in
+  *localhost*|*127.0.0.1*)
+    redis-server --daemonize yes --save "" --appendonly no
+    ;;
+esac
+
 # Start nginx in the background
 nginx -g "daemon off;" &
 
+# Start the Dramatiq render workers in the background.
+# Size the pool to the number of NVENC sessions the GPU can hold.
+dramatiq app.worker --processes "${RENDER_WORKERS:-2}" --threads 1 &
+
 # Start uvicorn in the foreground
-exec uvicorn app.main:app --host 0.0.0.0 --port 8080
\ No newline at end of file
+exec uvicorn app.main:app --host 0.0.0.0 --port 8080 --workers "${API_WORKERS:-2}"
\ No newline at end of file